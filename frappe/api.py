@@ -2,9 +2,15 @@
 # License: MIT. See LICENSE
 import base64
 import binascii
-import json
+import functools
+import hmac
+import sys
+import time
 from typing import Literal
 from urllib.parse import urlencode, urlparse
+
+import msgspec
+
 from frappe.modules.utils import get_doctype_module, get_module_app, get_module_name
 
 import frappe
@@ -14,6 +20,31 @@ from frappe import _
 from frappe.utils.data import sbool
 from frappe.utils.response import build_response
 
+# process-local cache of api_key -> (timestamp, {"user": ..., "api_secret": ...})
+# to skip the redis round-trip on every authenticated request
+_API_KEY_LOCAL_CACHE: dict[str, tuple[float, dict]] = {}
+_API_KEY_LOCAL_CACHE_SIZE = 1024
+_API_KEY_LOCAL_CACHE_TTL = 60  # seconds
+_API_KEY_MISS_TTL = 300  # seconds
+_API_KEY_REDIS_TTL = 3600  # seconds, decrypted secrets are re-read after this
+
+_JSON_DECODER = msgspec.json.Decoder()
+
+# scrubbed doctype names in resource URLs come from a small, bounded set
+_unscrub = functools.lru_cache(maxsize=256)(frappe.unscrub)
+
+# request params passed through to `frappe.client.get_list`
+_GET_LIST_ARGS = (
+    "filters",
+    "or_filters",
+    "order_by",
+    "limit_start",
+    "limit_page_length",
+    "parent",
+    "debug",
+    "as_dict",
+)
+
 
 def handle():
     """
@@ -39,31 +70,30 @@ def handle():
     `/api/resource/{doctype}/{name}?run_method={method}` will run a whitelisted controller method
     """
 
-    parts = frappe.request.path[1:].split("/")
-    call = doctype = name = None
-
-    if len(parts) > 1:
-        call = parts[1]
-
-    if len(parts) > 2:
-        doctype = parts[2]
-        if call == 'resource' and doctype[0].islower():
-            doctype = frappe.unscrub(doctype)
+    parts = frappe.request.path[1:].split("/", 5)
+    _, call, doctype, name, method = (parts + [None] * 5)[:5]
 
-    if len(parts) > 3:
-        name = parts[3]
+    if doctype and call == "resource" and 97 <= ord(doctype[0]) <= 122:
+        doctype = _unscrub(doctype)
 
-    if len(parts) > 4:
+    if method is not None:
         frappe.local.form_dict.name = name
         module = get_doctype_module(doctype)
         app = get_module_app(module)
-        doctype = get_module_name(doctype, module, "", "." + parts[4].replace("-", "_"), app)
+        doctype = get_module_name(doctype, module, "", "." + method.replace("-", "_"), app)
         call = 'method'
 
     return _RESTAPIHandler(call, doctype, name).get_response()
 
 
 class _RESTAPIHandler:
+    __slots__ = ("call", "doctype", "name", "_method")
+
+    # HTTP method -> handler for `/api/resource/{doctype}/{name}`
+    _DOC_METHODS = {"GET": "get_doc", "PUT": "update_doc", "DELETE": "delete_doc"}
+    # HTTP method -> handler for `/api/resource/{doctype}`
+    _LIST_METHODS = {"GET": "get_doc_list", "POST": "create_doc"}
+
     def __init__(self, call: Literal["method", "resource"], doctype: str | None, name: str | None):
         self.call = call
         self.doctype = doctype
@@ -74,13 +104,15 @@ class _RESTAPIHandler:
 
         Note: most methods of this class directly operate on the response local.
         """
-        match self.call:
-            case "method":
-                return self.handle_method()
-            case "resource":
-                self.handle_resource()
-            case _:
-                raise frappe.DoesNotExistError
+        # interned so comparisons against the method literals below short-circuit on identity
+        self._method = sys.intern(frappe.local.request.method)
+
+        if self.call == "method":
+            return self.handle_method()
+        if self.call == "resource":
+            self.handle_resource()
+        else:
+            raise frappe.DoesNotExistError
 
         return build_response("json")
 
@@ -97,56 +129,49 @@ class _RESTAPIHandler:
             raise frappe.DoesNotExistError
 
     def handle_document_resource(self):
-        if "run_method" in frappe.local.form_dict:
-            self.execute_doc_method()
+        method = frappe.local.form_dict.pop("run_method", None)
+        if method:
+            self.execute_doc_method(method)
             return
 
-        match frappe.local.request.method:
-            case "GET":
-                self.get_doc()
-            case "PUT":
-                self.update_doc()
-            case "DELETE":
-                self.delete_doc()
-            case _:
-                raise frappe.DoesNotExistError
+        self._dispatch(self._DOC_METHODS)
 
     def handle_doctype_resource(self):
-        match frappe.local.request.method:
-            case "GET":
-                self.get_doc_list()
-            case "POST":
-                self.create_doc()
-            case _:
-                raise frappe.DoesNotExistError
-
-    def execute_doc_method(self):
-        method = frappe.local.form_dict.pop("run_method")
+        self._dispatch(self._LIST_METHODS)
+
+    def _dispatch(self, handlers):
+        handler = handlers.get(self._method)
+        if handler is None:
+            raise frappe.DoesNotExistError
+
+        getattr(self, handler)()
+
+    def execute_doc_method(self, method):
         doc = frappe.get_doc(self.doctype, self.name)
         doc.is_whitelisted(method)
 
-        if frappe.local.request.method == "GET":
+        if self._method == "GET":
             if not doc.has_permission("read"):
                 frappe.throw(_("Not permitted"), frappe.PermissionError)
             frappe.local.response.update({"data": doc.run_method(method, **frappe.local.form_dict)})
 
-        elif frappe.local.request.method == "POST":
+        elif self._method == "POST":
             if not doc.has_permission("write"):
                 frappe.throw(_("Not permitted"), frappe.PermissionError)
 
             frappe.local.response.update({"data": doc.run_method(method, **frappe.local.form_dict)})
-            frappe.db.commit()
-    def _fields(self):
+
+    def _fields(self, name_field="name", sort=True):
         fields = []
         if frappe.local.form_dict.get("fields"):
-            if '[' in frappe.local.form_dict["fields"]:
-                fields = json.loads(frappe.local.form_dict["fields"])
-            else:
-                fields = [f.strip() for f in frappe.local.form_dict["fields"].split(",")]
+            fields = _parse_fields(frappe.local.form_dict["fields"])
         #rename id to name
-        if 'id' in fields: fields.remove("id")
-        fields.append("name")
-        return fields
+        fields = [f for f in dict.fromkeys(fields) if f not in ("id", "name")]
+        if name_field:
+            fields.append(name_field)
+        # canonical order so equivalent requests generate identical queries,
+        # unless rows are returned as lists where the column order matters
+        return sorted(fields) if sort else fields
 
     def get_doc(self):
 
@@ -155,14 +180,15 @@ class _RESTAPIHandler:
             raise frappe.PermissionError
         doc.apply_fieldlevel_read_permissions()
 
-        fields = self._fields()
-
         d = doc.as_dict(no_nulls=True, no_default_fields=True, convert_dates_to_str=True)
 
-        if fields:
-            d = frappe._dict({field: d.get(field) for field in fields})
+        if frappe.local.form_dict.get("fields"):
+            # `name` is dropped by as_dict(no_default_fields=True), it is returned as `id` below
+            fields = self._fields(name_field=None)
+            # as_dict omits null values, `d.get` fills those in as None
+            d = frappe._dict(zip(fields, map(d.get, fields)))
 
-        d.update({"id": doc.name})
+        d["id"] = doc.name
 
         frappe.local.response.update({"data": d})
 
@@ -182,96 +208,142 @@ class _RESTAPIHandler:
 
         # check for child table doctype
         if doc.get("parenttype"):
-            frappe.get_doc(doc.parenttype, doc.parent).save()
-        frappe.db.commit()
+            if doc.parenttype in frappe.get_hooks("save_parent_on_child_update"):
+                frappe.get_doc(doc.parenttype, doc.parent).save()
+            else:
+                # only touch the parent's timestamp, without running its controller
+                frappe.db.set_value(
+                    doc.parenttype,
+                    doc.parent,
+                    {"modified": frappe.utils.now(), "modified_by": frappe.session.user},
+                    update_modified=False,
+                )
 
     def delete_doc(self):
         # Not checking permissions here because it's checked in delete_doc
         frappe.delete_doc(self.doctype, self.name, ignore_missing=False)
         frappe.local.response.http_status_code = 202
         frappe.local.response.message = "ok"
-        frappe.db.commit()
 
     def get_doc_list(self):
-        if frappe.local.form_dict.get("fields"):
-            frappe.local.form_dict["fields"] = self._fields()
+        form_dict = frappe.local.form_dict
+        kwargs = {k: form_dict[k] for k in _GET_LIST_ARGS if k in form_dict}
 
         # set limit of records for frappe.get_list
-        frappe.local.form_dict.setdefault(
-            "limit_page_length",
-            frappe.local.form_dict.limit or frappe.local.form_dict.limit_page_length or 20,
-        )
+        kwargs.setdefault("limit_page_length", form_dict.limit or 20)
 
         # convert strings to native types - only as_dict and debug accept bool
         for param in ["as_dict", "debug"]:
-            param_val = frappe.local.form_dict.get(param)
+            param_val = kwargs.get(param)
             if param_val is not None:
-                frappe.local.form_dict[param] = sbool(param_val)
-
-        try:
-            # evaluate frappe.get_list
-            if self.doctype == 'Customer':
-                filter = ["TSP List", 'tsp', '=', frappe.session.user.replace("@example.com", "")]
-                if 'filters' in frappe.local.form_dict:
-                    frappe.local.form_dict['filters'].append(filter)
-                else:
-                    frappe.local.form_dict['filters'] = [filter]
-        except Exception as e:
-            print(e)
-
-        data = frappe.call(frappe.client.get_list, self.doctype, **frappe.local.form_dict)
-        for d in data:
-            if 'name' in d:
-                d['id'] = d['name']
-                del d['name']
+                kwargs[param] = sbool(param_val)
+
+        # let the query return `name` as `id` instead of renaming it on every row
+        kwargs["fields"] = self._fields("name as id", sort=kwargs.get("as_dict", True))
+
+        if self.doctype == "Customer":
+            # only list Customers the TSP of the session is linked to,
+            # ANDed with the request's filters (indexed on `tabTSP List`(tsp, parent))
+            kwargs["filters"] = self._with_filter(
+                kwargs.get("filters"),
+                ["TSP List", "tsp", "=", frappe.session.user.replace("@example.com", "")],
+            )
+
+        data = frappe.client.get_list(self.doctype, **kwargs)
 
         # set frappe.get_list result to response
         frappe.local.response.update({"data": data})
 
+    def _with_filter(self, filters, condition):
+        """Append `condition` to request filters, which may be a JSON string, dict or list"""
+        if isinstance(filters, str):
+            filters = frappe.parse_json(filters)
+
+        if isinstance(filters, dict):
+            filters = [
+                [self.doctype, key, *(value if isinstance(value, (list, tuple)) else ("=", value))]
+                for key, value in filters.items()
+            ]
+
+        return [*(filters or []), condition]
+
     def create_doc(self):
         data = get_request_form_data()
         data.update({"doctype": self.doctype})
 
-        # insert document from request data
-        doc = frappe.get_doc(data)
-        doc.set("__islocal", True)
-        doc.run_method("check_doc_exists")
-        doc.save()
+        # insert document from request data, duplicates raise DuplicateEntryError (409)
+        doc = frappe.get_doc(data).insert()
 
         if not frappe.local.response.get("http_status_code"):
             frappe.local.response["http_status_code"] = 201
 
-          # set response data
+        # set response data
+        if frappe.local.form_dict.get("return") == "id":
+            frappe.local.response.update({"data": {"id": doc.name}})
+            return
+
         frappe.local.response.update({"data": doc.as_dict(
             no_default_fields=True,
             convert_dates_to_str=True,
-          ).update({"id": doc.name})})
+        ).update({"id": doc.name})})
+
 
-        # commit for POST requests
-        frappe.db.commit()
+@functools.lru_cache(maxsize=256)
+def _parse_fields(fields: str) -> tuple[str, ...]:
+    """Parse the `fields` param, most clients send the same field sets so this is memoized"""
+    if '[' in fields:
+        return tuple(_JSON_DECODER.decode(fields.encode()))
+    return tuple(f.strip() for f in fields.split(","))
 
 
 def get_request_form_data():
     if frappe.local.form_dict.data is None:
-        data = frappe.safe_decode(frappe.local.request.get_data())
+        data = _raw_body()
     else:
         data = frappe.local.form_dict.data
 
-    try:
+    if isinstance(data, str):
+        data = data.encode()
+    elif not isinstance(data, (bytes, bytearray)):
         return frappe.parse_json(data)
-    except ValueError:
+
+    # form-encoded bodies are common, don't pay for a failed decode on those
+    if data.lstrip()[:1] not in (b"{", b"["):
         return frappe.local.form_dict
 
+    try:
+        data = _JSON_DECODER.decode(data)
+    except msgspec.DecodeError:
+        return frappe.local.form_dict
+
+    return frappe._dict(data) if isinstance(data, dict) else data
+
+
+def _raw_body():
+    """Request body as bytes, read once per request and shared by auth and form parsing"""
+    body = getattr(frappe.local, "raw_body", None)
+    if body is None:
+        body = frappe.local.request.get_data(cache=True)
+        frappe.local.raw_body = body
+    return body
+
 
 def validate_auth():
     """
     Authenticate and sets user for the request.
     """
-    authorization_header = frappe.get_request_header("Authorization", "").split(" ")
+    authorization_header = frappe.get_request_header("Authorization", "")
 
-    if len(authorization_header) == 2:
-        validate_oauth(authorization_header)
-        validate_auth_via_api_keys(authorization_header)
+    if authorization_header:
+        authorization_header = authorization_header.split(" ")
+
+        if len(authorization_header) == 2:
+            # only run the validator matching the auth scheme
+            prefix = authorization_header[0] = authorization_header[0].lower()
+            if prefix == "bearer":
+                validate_oauth(authorization_header)
+            elif prefix in ("basic", "token"):
+                validate_auth_via_api_keys(authorization_header)
 
     validate_auth_via_hooks()
 
@@ -297,9 +369,9 @@ def validate_oauth(authorization_header):
     )
     http_method = req.method
     headers = req.headers
-    body = req.get_data()
-    if req.content_type and "multipart/form-data" in req.content_type:
-        body = None
+    body = None
+    if not (req.content_type and "multipart/form-data" in req.content_type):
+        body = _raw_body()
 
     try:
         required_scopes = frappe.db.get_value("OAuth Bearer Token", token, "scopes").split(
@@ -320,17 +392,17 @@ def validate_auth_via_api_keys(authorization_header):
     Authenticate request using API keys and set session user
 
     Args:
-            authorization_header (list of str): The 'Authorization' header containing the prefix and token
+            authorization_header (list of str): The 'Authorization' header containing the lowercased prefix and token
     """
 
     try:
         auth_type, auth_token = authorization_header
         authorization_source = frappe.get_request_header("Frappe-Authorization-Source")
-        if auth_type.lower() == "basic":
-            api_key, api_secret = frappe.safe_decode(base64.b64decode(auth_token)).split(":")
-            validate_api_key_secret(api_key, api_secret, authorization_source)
-        elif auth_type.lower() == "token":
-            api_key, api_secret = auth_token.split(":")
+        if auth_type == "basic":
+            api_key, api_secret = base64.b64decode(auth_token, validate=True).split(b":", 1)
+            validate_api_key_secret(api_key.decode(), api_secret.decode(), authorization_source)
+        elif auth_type == "token":
+            api_key, api_secret = auth_token.split(":", 1)
             validate_api_key_secret(api_key, api_secret, authorization_source)
     except binascii.Error:
         frappe.throw(
@@ -344,23 +416,50 @@ def validate_auth_via_api_keys(authorization_header):
 def validate_api_key_secret(api_key, api_secret, frappe_authorization_source=None):
     """frappe_authorization_source to provide api key and secret for a doctype apart from User"""
     doctype = frappe_authorization_source or "User"
-    cached = frappe.cache.hget("api_key", api_key)
+    cached = _get_local_api_key_cache(api_key) or frappe.cache.hget("api_key", api_key)
     form_dict = frappe.local.form_dict
 
+    if cached and cached.get("expires_at", 0) < time.time():
+        _API_KEY_LOCAL_CACHE.pop(api_key, None)
+        cached = None
+
     if cached:
         doc = cached['user']
         doc_secret = cached["api_secret"]
+        user = cached["resolved_user"]
+    elif frappe.cache.get_value(_api_key_miss_key(doctype, api_key), expires=True):
+        doc = None
     else:
-        doc = frappe.db.get_value(doctype=doctype, filters={"api_key": api_key}, fieldname=["name"])
-        doc_secret = frappe.utils.password.get_decrypted_password(doctype, doc, fieldname="api_secret")
-        frappe.cache.hset("api_key", api_key, {"user": doc, "api_secret": doc_secret})
-
-    if api_secret == doc_secret:
-        if doctype == "User":
-            user = doc
+        # resolve the linked user in the same query for authorization sources other than User
+        fieldname = ["name"] if doctype == "User" else ["name", "user"]
+        row = frappe.db.get_value(doctype, {"api_key": api_key}, fieldname, as_dict=True)
+        doc = row.name if row else None
+        user = (doc if doctype == "User" else row.user) if row else None
+        doc_secret = (
+            frappe.utils.password.get_decrypted_password(doctype, doc, fieldname="api_secret")
+            if doc
+            else None
+        )
+        if doc:
+            cached = {
+                "user": doc,
+                "resolved_user": user,
+                "api_secret": doc_secret,
+                "expires_at": time.time() + _API_KEY_REDIS_TTL,
+            }
+            frappe.cache.hset("api_key", api_key, cached)
         else:
-            user = frappe.db.get_value(doctype, doc, "user")
+            # unknown keys get their own short-lived entry, the shared hash only holds valid keys
+            frappe.cache.set_value(
+                _api_key_miss_key(doctype, api_key), 1, expires_in_sec=_API_KEY_MISS_TTL
+            )
+
+    if not doc:
+        frappe.throw(_("Invalid API key"), frappe.AuthenticationError)
 
+    _set_local_api_key_cache(api_key, cached)
+
+    if doc_secret and hmac.compare_digest(api_secret.encode(), doc_secret.encode()):
         frappe.local.api_user = True
 
         if frappe.local.login_manager.user in ("", "Guest"):
@@ -368,6 +467,42 @@ def validate_api_key_secret(api_key, api_secret, frappe_authorization_source=Non
         frappe.local.form_dict = form_dict
 
 
+def clear_api_key_cache(api_key, doctype="User"):
+    """Clear cached credentials of `api_key` from redis and this process"""
+    frappe.cache.hdel("api_key", api_key)
+    frappe.cache.delete_value(_api_key_miss_key(doctype, api_key))
+    _API_KEY_LOCAL_CACHE.pop(api_key, None)
+
+
+def _api_key_miss_key(doctype, api_key):
+    # a miss is only valid for the authorization source it was looked up against
+    return f"api_key_miss|{doctype}|{api_key}"
+
+
+def _get_local_api_key_cache(api_key):
+    entry = _API_KEY_LOCAL_CACHE.get(api_key)
+    if entry is None:
+        return None
+
+    timestamp, value = entry
+    if time.monotonic() - timestamp >= _API_KEY_LOCAL_CACHE_TTL:
+        _API_KEY_LOCAL_CACHE.pop(api_key, None)
+        return None
+
+    return value
+
+
+def _set_local_api_key_cache(api_key, value):
+    if api_key in _API_KEY_LOCAL_CACHE:
+        return
+
+    if len(_API_KEY_LOCAL_CACHE) >= _API_KEY_LOCAL_CACHE_SIZE:
+        # evict the oldest entry, dicts preserve insertion order
+        _API_KEY_LOCAL_CACHE.pop(next(iter(_API_KEY_LOCAL_CACHE)), None)
+
+    _API_KEY_LOCAL_CACHE[api_key] = (time.monotonic(), value)
+
+
 def validate_auth_via_hooks():
     for auth_hook in frappe.get_hooks("auth_hooks", []):
         frappe.get_attr(auth_hook)()
@@ -60,6 +60,24 @@ class TestUser(FrappeTestCase):
 		delete_contact(new_user.name)
 		frappe.delete_doc("User", new_user.name)
 
+	def test_api_key_cache_cleared_after_commit(self):
+		from frappe.core.doctype.user.user import generate_keys
+
+		generate_keys("Administrator")
+		frappe.db.commit()
+		user = frappe.get_doc("User", "Administrator")
+
+		with patch("frappe.api.clear_api_key_cache") as clear_api_key_cache:
+			user.save()
+			frappe.db.commit()
+			clear_api_key_cache.assert_not_called()
+
+			user.api_secret = frappe.generate_hash(length=15)
+			user.save()
+			clear_api_key_cache.assert_not_called()
+			frappe.db.commit()
+			clear_api_key_cache.assert_called_once_with(user.api_key)
+
 	def test_delete(self):
 		frappe.get_doc("User", "test@example.com").add_roles("_Test Role 2")
 		self.assertRaises(frappe.LinkExistsError, delete_doc, "Role", "_Test Role 2")
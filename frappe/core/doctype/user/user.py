@@ -1,6 +1,7 @@
 # Copyright (c) 2015, Frappe Technologies Pvt. Ltd. and Contributors
 # License: MIT. See LICENSE
 from datetime import timedelta
+from functools import partial
 from typing import Optional, Sequence
 
 import frappe
@@ -69,6 +70,11 @@ class User(Document):
 		self.__new_password = self.new_password
 		self.new_password = ""
 
+		# checked before the secret is replaced by a dummy value on save
+		self.flags.api_credentials_changed = self.has_value_changed("api_key") or self.has_value_changed(
+			"api_secret"
+		)
+
 		if not frappe.flags.in_test:
 			self.password_strength_test()
 
@@ -153,6 +159,19 @@ class User(Document):
 		elif self.has_value_changed("allow_in_mentions") or self.has_value_changed("user_type"):
 			frappe.cache.delete_key("users_for_mentions")
 
+		if self.flags.api_credentials_changed:
+			self.clear_api_key_cache()
+
+	def clear_api_key_cache(self):
+		"""Drop cached API credentials once the change is committed,
+		clearing earlier would let other workers cache the old secret again"""
+		from frappe.api import clear_api_key_cache
+
+		doc_before_save = self.get_doc_before_save()
+		for api_key in {self.api_key, doc_before_save and doc_before_save.api_key}:
+			if api_key:
+				frappe.db.after_commit.add(partial(clear_api_key_cache, api_key))
+
 	def has_website_permission(self, ptype, user, verbose=False):
 		"""Returns true if current user is the session user"""
 		return self.name == frappe.session.user
@@ -424,6 +443,7 @@ class User(Document):
 
 	def on_trash(self):
 		frappe.clear_cache(user=self.name)
+		self.clear_api_key_cache()
 		if self.name in STANDARD_USERS:
 			throw(_("User {0} cannot be deleted").format(self.name))
 
@@ -0,0 +1,9 @@
+import frappe
+
+
+def execute():
+	# `TSP List` is used to scope Customer API queries, index the columns used by that subquery
+	if not frappe.db.table_exists("TSP List"):
+		return
+
+	frappe.db.add_index("TSP List", ["tsp", "parent"])
@@ -180,6 +180,19 @@ class TestResourceAPI(FrappeAPITestCase):
 		self.assertIsInstance(docname, str)
 		self.GENERATED_DOCUMENTS.append(docname)
 
+	def test_create_document_return_id(self):
+		data = {"description": frappe.mock("paragraph"), "sid": self.sid, "return": "id"}
+		response = self.post(f"/api/resource/{self.DOCTYPE}", data)
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(list(response.json["data"]), ["id"])
+		self.GENERATED_DOCUMENTS.append(response.json["data"]["id"])
+
+	def test_create_duplicate_document(self):
+		with suppress_stdout():
+			response = self.post("/api/resource/Role", {"role_name": "System Manager", "sid": self.sid})
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(response.json["exc_type"], "DuplicateEntryError")
+
 	def test_update_document(self):
 		# test 8: PUT method on /api/resource to update doc
 		generated_desc = frappe.mock("paragraph")
@@ -229,6 +242,58 @@ class TestResourceAPI(FrappeAPITestCase):
 			self.assertIsInstance(data[0], dict)
 
 
+class TestChildResourceAPI(FrappeAPITestCase):
+	def setUp(self):
+		self.contact = frappe.get_doc(
+			{
+				"doctype": "Contact",
+				"first_name": "_Test Child Resource",
+				"email_ids": [{"email_id": "child-resource@example.com"}],
+			}
+		).insert()
+		frappe.db.set_value("Contact", self.contact.name, "modified", "2000-01-01 00:00:00")
+		frappe.db.commit()
+		self.addCleanup(frappe.db.commit)
+		self.addCleanup(frappe.delete_doc, "Contact", self.contact.name, force=True)
+
+	def update_child_row(self):
+		row = self.contact.email_ids[0]
+		return self.put(
+			f"/api/resource/Contact Email/{row.name}",
+			data={"email_id": "child-resource-updated@example.com", "sid": self.sid},
+		)
+
+	def test_child_update_touches_parent(self):
+		from frappe.contacts.doctype.contact.contact import Contact
+
+		with patch.object(Contact, "validate") as validate:
+			response = self.update_child_row()
+
+		self.assertEqual(response.status_code, 200)
+		validate.assert_not_called()
+		modified, modified_by = frappe.db.get_value(
+			"Contact", self.contact.name, ["modified", "modified_by"]
+		)
+		self.assertGreater(str(modified), "2000-01-01 00:00:00")
+		self.assertEqual(modified_by, "Administrator")
+
+	def test_child_update_saves_parent_via_hook(self):
+		from frappe.contacts.doctype.contact.contact import Contact
+
+		get_hooks = frappe.get_hooks
+
+		def patch_hooks(hook, *args, **kwargs):
+			if hook == "save_parent_on_child_update":
+				return ["Contact"]
+			return get_hooks(hook, *args, **kwargs)
+
+		with patch("frappe.get_hooks", patch_hooks), patch.object(Contact, "validate") as validate:
+			response = self.update_child_row()
+
+		self.assertEqual(response.status_code, 200)
+		validate.assert_called_once()
+
+
 class TestMethodAPI(FrappeAPITestCase):
 	METHOD_PATH = "/api/method"
 
@@ -276,6 +341,31 @@ class TestMethodAPI(FrappeAPITestCase):
 
 		authorization_token = None
 
+	def test_auth_secret_with_colon(self):
+		import base64
+
+		from frappe.core.doctype.user.user import generate_keys
+
+		generate_keys("Administrator")
+		self.addCleanup(frappe.db.commit)
+		self.addCleanup(generate_keys, "Administrator")
+
+		user = frappe.get_doc("User", "Administrator")
+		user.api_secret = "first:second"
+		user.save()
+		frappe.db.commit()
+
+		credentials = f"{user.api_key}:first:second"
+		for authorization in (
+			f"token {credentials}",
+			f"Basic {base64.b64encode(credentials.encode()).decode()}",
+		):
+			response = self.get(
+				"/api/method/frappe.auth.get_logged_user", headers={"Authorization": authorization}
+			)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response.json["message"], "Administrator")
+
 	def test_404s(self):
 		response = self.get("/api/rest", {"sid": self.sid})
 		self.assertEqual(response.status_code, 404)
@@ -331,6 +421,181 @@ class TestWSGIApp(FrappeAPITestCase):
 			self.assertLess(_test_REQ_HOOK.get("before_request"), _test_REQ_HOOK.get("after_request"))
 
 
+class TestCustomerScope(FrappeAPITestCase):
+	TSP_FILTER = ["TSP List", "tsp", "=", "Administrator"]
+
+	def get_list_filters(self, params):
+		with patch("frappe.client.get_list", return_value=[]) as get_list:
+			response = self.get("/api/resource/Customer", {"sid": self.sid, **params})
+
+		self.assertEqual(response.status_code, 200)
+		return get_list.call_args.kwargs["filters"]
+
+	def test_resource_list_is_scoped(self):
+		self.assertEqual(self.get_list_filters({}), [self.TSP_FILTER])
+
+	def test_scope_is_anded_with_request_filters(self):
+		# shared documents are ORed into permission query conditions, filters are always ANDed
+		self.assertEqual(
+			self.get_list_filters({"filters": '[["Customer", "customer_group", "=", "Retail"]]'}),
+			[["Customer", "customer_group", "=", "Retail"], self.TSP_FILTER],
+		)
+		self.assertEqual(
+			self.get_list_filters({"filters": '{"customer_group": "Retail", "disabled": ["!=", 1]}'}),
+			[
+				["Customer", "customer_group", "=", "Retail"],
+				["Customer", "disabled", "!=", 1],
+				self.TSP_FILTER,
+			],
+		)
+
+	def test_reportview_is_not_scoped(self):
+		with patch("frappe.desk.reportview.execute", return_value=[]) as execute:
+			response = self.get(
+				"/api/method/frappe.desk.reportview.get",
+				{"sid": self.sid, "doctype": "ToDo", "fields": '["name"]'},
+			)
+
+		self.assertEqual(response.status_code, 200)
+		self.assertNotIn("TSP List", str(execute.call_args.kwargs.get("filters")))
+
+
+class TestAPIKeyCache(FrappeTestCase):
+	def setUp(self):
+		from frappe.api import _API_KEY_LOCAL_CACHE
+
+		_API_KEY_LOCAL_CACHE.clear()
+		self.addCleanup(_API_KEY_LOCAL_CACHE.clear)
+
+	def get_api_credentials(self):
+		from frappe.api import clear_api_key_cache
+		from frappe.core.doctype.user.user import generate_keys
+
+		generate_keys("Administrator")
+		user = frappe.get_doc("User", "Administrator")
+		# the user's own clear only runs after commit
+		clear_api_key_cache(user.api_key)
+		return user.api_key, user.get_password("api_secret")
+
+	def test_local_cache_skips_redis(self):
+		from frappe.api import validate_api_key_secret
+
+		api_key, api_secret = self.get_api_credentials()
+		login_manager = frappe._dict(user="Administrator")
+
+		with patch.object(frappe.local, "login_manager", login_manager, create=True):
+			validate_api_key_secret(api_key, api_secret)
+			with patch.object(frappe.cache, "hget") as hget:
+				validate_api_key_secret(api_key, api_secret)
+				hget.assert_not_called()
+
+	def test_clear_api_key_cache(self):
+		from frappe.api import _API_KEY_LOCAL_CACHE, clear_api_key_cache, validate_api_key_secret
+
+		api_key, api_secret = self.get_api_credentials()
+		login_manager = frappe._dict(user="Administrator")
+
+		with patch.object(frappe.local, "login_manager", login_manager, create=True):
+			validate_api_key_secret(api_key, api_secret)
+		self.assertIn(api_key, _API_KEY_LOCAL_CACHE)
+
+		clear_api_key_cache(api_key)
+		self.assertNotIn(api_key, _API_KEY_LOCAL_CACHE)
+		self.assertIsNone(frappe.cache.hget("api_key", api_key))
+
+	def test_local_cache_expiry_and_eviction(self):
+		import frappe.api
+		from frappe.api import _API_KEY_LOCAL_CACHE, _get_local_api_key_cache, _set_local_api_key_cache
+
+		with patch.object(frappe.api, "_API_KEY_LOCAL_CACHE_SIZE", 2):
+			for key in ("a", "b", "c"):
+				_set_local_api_key_cache(key, {"user": key, "api_secret": key})
+			self.assertEqual(list(_API_KEY_LOCAL_CACHE), ["b", "c"])
+
+		with patch.object(frappe.api, "_API_KEY_LOCAL_CACHE_TTL", 0):
+			self.assertIsNone(_get_local_api_key_cache("b"))
+		self.assertNotIn("b", _API_KEY_LOCAL_CACHE)
+
+	def test_invalid_api_key_is_negatively_cached(self):
+		from frappe.api import clear_api_key_cache, validate_api_key_secret
+
+		api_key = frappe.generate_hash(length=15)
+		self.addCleanup(clear_api_key_cache, api_key)
+
+		self.assertRaises(frappe.AuthenticationError, validate_api_key_secret, api_key, "secret")
+		with patch.object(frappe.db, "get_value") as get_value:
+			self.assertRaises(frappe.AuthenticationError, validate_api_key_secret, api_key, "secret")
+			get_value.assert_not_called()
+
+		# misses must not touch the shared hash of valid keys
+		self.assertIsNone(frappe.cache.hget("api_key", api_key))
+		self.assertLess(frappe.cache.ttl(frappe.cache.make_key("api_key")), 0)
+
+	def test_api_key_miss_is_per_source(self):
+		from frappe.api import clear_api_key_cache, validate_api_key_secret
+
+		api_key, api_secret = self.get_api_credentials()
+		self.addCleanup(clear_api_key_cache, api_key, "Other Source")
+		clear_api_key_cache(api_key)
+
+		# the key is unknown to another authorization source
+		with patch.object(frappe.db, "get_value", return_value=None):
+			self.assertRaises(
+				frappe.AuthenticationError, validate_api_key_secret, api_key, api_secret, "Other Source"
+			)
+
+		login_manager = frappe._dict(user="Guest")
+		with patch.object(frappe.local, "login_manager", login_manager, create=True), patch.object(
+			frappe, "set_user"
+		) as set_user:
+			validate_api_key_secret(api_key, api_secret)
+			set_user.assert_called_once_with("Administrator")
+
+
+class TestRequestFormData(FrappeTestCase):
+	def get_form_data(self, body=b"", form_dict=None, content_type="application/json"):
+		from frappe.api import get_request_form_data
+		from frappe.utils import set_request
+
+		set_request(method="POST", path="/api/resource/ToDo", data=body, content_type=content_type)
+		frappe.local.raw_body = None
+		frappe.local.form_dict = frappe._dict(form_dict or {})
+		self.addCleanup(setattr, frappe.local, "raw_body", None)
+		self.addCleanup(setattr, frappe.local, "form_dict", frappe._dict())
+		return get_request_form_data()
+
+	def test_json_body(self):
+		data = self.get_form_data(b' {"description": "json body"}')
+		self.assertIsInstance(data, frappe._dict)
+		self.assertEqual(data, {"description": "json body"})
+		self.assertEqual(self.get_form_data(b'[{"description": "row"}]'), [{"description": "row"}])
+
+	def test_form_encoded_body(self):
+		form_dict = {"description": "form body"}
+		data = self.get_form_data(
+			b"description=form+body", form_dict, content_type="application/x-www-form-urlencoded"
+		)
+		self.assertIs(data, frappe.local.form_dict)
+		self.assertEqual(data, form_dict)
+
+	def test_json_in_data_param(self):
+		data = self.get_form_data(
+			b"",
+			{"data": '{"description": "data param"}'},
+			content_type="application/x-www-form-urlencoded",
+		)
+		self.assertIsInstance(data, frappe._dict)
+		self.assertEqual(data, {"description": "data param"})
+
+	def test_malformed_json(self):
+		for body in (b'{"description": ', b"[1, 2"):
+			self.assertIs(self.get_form_data(body), frappe.local.form_dict)
+
+	def test_scalar_json(self):
+		# only JSON objects and arrays are treated as request data
+		self.assertIs(self.get_form_data(b"42"), frappe.local.form_dict)
+
+
 _test_REQ_HOOK = {}
 
 